@@ -10,5 +10,5 @@ from .parts import TouchSensor
 from .parts import Temperature
 from .parts import UltrasonicSensor
 from .parts import Accelerometer
-# from parts import Gyro
+from .parts import Gyro
 
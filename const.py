@@ -57,6 +57,50 @@ class ACCConfig:
     HIGH_RESOLUTION = True
     LOW_RESOLUTION = False
 
+    # Output data rate (CTRL_REG1 DR)
+    ODR_800 = 0x00
+    ODR_400 = 0x08
+    ODR_200 = 0x10
+    ODR_100 = 0x18
+    ODR_50 = 0x20
+    ODR_12_5 = 0x28
+    ODR_6_25 = 0x30
+    ODR_1_56 = 0x38
+
+    # Oversampling mode (CTRL_REG2 MODS / SMODS)
+    MODE_NORMAL = 0x00
+    MODE_LOW_NOISE_LOW_POWER = 0x01
+    MODE_HIGH_RESOLUTION = 0x02
+    MODE_LOW_POWER = 0x03
+
+    # Auto-sleep data rate (CTRL_REG1 ASLP_RATE)
+    ASLP_50 = 0x00
+    ASLP_12_5 = 0x40
+    ASLP_6_25 = 0x80
+    ASLP_1_56 = 0xC0
+
+    # Wake sources (CTRL_REG3)
+    WAKE_MOTION = 0x08
+    WAKE_ORIENTATION = 0x20
+
+
+class GyroConfig:
+    DPS_250 = 250
+    DPS_500 = 500
+    DPS_2000 = 2000
+
+
+class Gesture:
+    NONE = 0
+    SHAKE = 1
+    FREEFALL = 2
+    FACE_UP = 3
+    FACE_DOWN = 4
+    TILT_LEFT = 5
+    TILT_RIGHT = 6
+    TILT_FORWARD = 7
+    TILT_BACK = 8
+
 
 class DCCntrl:
     CW = 0
@@ -0,0 +1,203 @@
+from . import timers
+from .const import DCCntrl
+import array
+import machine
+import time
+
+
+class PID():
+    """Integer PID block.
+
+    Gains are fixed-point values scaled by 2**shift, so kp=256 with the
+    default shift=8 is a proportional gain of 1.0. When a DCMotor is given,
+    update() drives it directly: positive output turns CW, negative CCW.
+    """
+
+    def __init__(self, kp, ki, kd, *, shift=8, out_min=-255, out_max=255, motor=None):
+        if out_min > out_max:
+            raise ValueError('out_min must be less than out_max')
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.shift = shift
+        self.out_min = out_min
+        self.out_max = out_max
+        self.motor = motor
+        self.reset()
+
+    def reset(self):
+        self._integral = 0
+        self._prev_error = 0
+        self.output = 0
+
+    def update(self, setpoint, measured):
+        error = setpoint - measured
+
+        # anti-windup: keep the integral term inside the output range
+        self._integral += error
+        if self.ki:
+            i_max = (self.out_max << self.shift) // self.ki
+            i_min = (self.out_min << self.shift) // self.ki
+            if i_max < i_min:
+                i_max, i_min = i_min, i_max
+            if self._integral > i_max:
+                self._integral = i_max
+            elif self._integral < i_min:
+                self._integral = i_min
+
+        derivative = error - self._prev_error
+        self._prev_error = error
+
+        out = (self.kp * error + self.ki * self._integral + self.kd * derivative) >> self.shift
+        if out > self.out_max:
+            out = self.out_max
+        elif out < self.out_min:
+            out = self.out_min
+        self.output = out
+
+        if self.motor is not None:
+            self._drive(out)
+        return out
+
+    def _drive(self, out):
+        if out > 0:
+            direction = DCCntrl.CW
+        elif out < 0:
+            direction = DCCntrl.CCW
+            out = -out
+        else:
+            direction = DCCntrl.STOP
+        if out > 255:
+            out = 255
+        # DCMotor drops the write when the direction is unchanged, and
+        # resending every update undoes stop()/brake() made outside the PID
+        self.motor.action(direction)
+        self.motor.power(out)
+
+
+class ControlLoop():
+    """Run step(inputs, outputs) at a fixed period from a hardware timer.
+
+    inputs and outputs are preallocated array('i') buffers that are handed
+    to every call, so the loop itself allocates nothing once started.
+    Each tick records how late it fired against the ideal schedule
+    (jitter) and counts overruns, i.e. steps that took longer than the
+    period and ticks that never ran. Timer callbacks are soft (scheduled),
+    so a slow step or a busy scheduler delays or drops ticks instead of
+    re-entering step(); a tick a full period or more late counts the
+    periods it missed and restarts the schedule from now.
+    """
+
+    def __init__(self, period_ms, step, *, inputs=4, outputs=4, timer_id=0):
+        if period_ms <= 0:
+            raise ValueError('period_ms must be more than 0')
+        self.period_ms = period_ms
+        self._period_us = period_ms * 1000
+        self.step = step
+        self.inputs = array.array('i', bytearray(4 * inputs))
+        self.outputs = array.array('i', bytearray(4 * outputs))
+        self._timer_id = timer_id
+        self._timer = None
+        self._tick_cb = self._tick  # bind once, not on every start()
+        self._running = False
+        self._next = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.count = 0
+        self.overruns = 0
+        self.max_jitter_us = 0
+        self.total_jitter_us = 0
+        self.max_exec_us = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._timer = timers.claim(self._timer_id, self)
+        self.reset_stats()
+        self._next = time.ticks_add(time.ticks_us(), self._period_us)
+        self._running = True
+        self._timer.init(period=self.period_ms, mode=machine.Timer.PERIODIC,
+                         callback=self._tick_cb)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            timers.release(self._timer_id, self)
+            self._timer = None
+        self._running = False
+
+    def is_running(self):
+        return self._running
+
+    def stats(self):
+        """(count, overruns, max_jitter_us, mean_jitter_us, max_exec_us)"""
+        mean = self.total_jitter_us // self.count if self.count else 0
+        return (self.count, self.overruns, self.max_jitter_us, mean,
+                self.max_exec_us)
+
+    def _tick(self, t):
+        now = time.ticks_us()
+        jitter = time.ticks_diff(now, self._next)
+        if jitter >= self._period_us:
+            # lost callbacks; catch up instead of staying behind for good
+            self.overruns += jitter // self._period_us
+            self._next = time.ticks_add(now, self._period_us)
+        else:
+            self._next = time.ticks_add(self._next, self._period_us)
+        if jitter < 0:
+            jitter = -jitter
+        if jitter > self.max_jitter_us:
+            self.max_jitter_us = jitter
+        self.total_jitter_us += jitter
+
+        try:
+            self.step(self.inputs, self.outputs)
+        finally:
+            elapsed = time.ticks_diff(time.ticks_us(), now)
+            if elapsed > self.max_exec_us:
+                self.max_exec_us = elapsed
+            if elapsed > self._period_us:
+                self.overruns += 1
+            self.count += 1
+
+
+class SpeedController():
+    """Closed-loop speed control of a DCMotor from an IRPhotoReflector in
+    encoder mode (see IRPhotoReflector.start_encoder()).
+
+    The encoder has one channel, so it measures speed but not direction;
+    the sign of the target picks CW/CCW and the PID only sets the power.
+    Call update() at a fixed rate, e.g. for two wheels:
+
+        left = SpeedController(m1, enc1, 64, 16)
+        right = SpeedController(m2, enc2, 64, 16)
+        loop = ControlLoop(20, lambda i, o: (left.update(), right.update()))
+    """
+
+    def __init__(self, motor, encoder, kp, ki, kd=0, *, shift=8):
+        self.motor = motor
+        self.encoder = encoder
+        self._pid = PID(kp, ki, kd, shift=shift, out_min=0, out_max=255)
+        self.target = 0
+
+    def set_target(self, rpm):
+        if (rpm >= 0) != (self.target >= 0):
+            self._pid.reset()
+        self.target = rpm
+
+    def update(self):
+        target = self.target
+        if target == 0:
+            self._pid.reset()
+            self.motor.stop()
+            return 0
+        if target > 0:
+            self.motor.action(DCCntrl.CW)
+        else:
+            self.motor.action(DCCntrl.CCW)
+            target = -target
+        # DCMotor drops the writes when direction/power are unchanged
+        out = self._pid.update(target, self.encoder.get_rpm())
+        self.motor.power(out)
+        return out
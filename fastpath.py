@@ -0,0 +1,152 @@
+"""Integer-only versions of the decoding and classification inner loops.
+
+The functions here are the pure-Python reference implementations. When the
+firmware has the viper emitter, the ones in fastpath_viper replace them at
+import time; EMITTER tells which set is in use. bench() times both on the
+device; no measured numbers are recorded here, so run it on the target
+firmware to see the speedup.
+"""
+from .const import ColorSensorConfig
+import array
+import time
+
+# XYZ matrix of ColorSensor scaled by 2048. With 8-bit RGB and
+# coordinates in 1/1000 units every product stays inside 31 bits,
+# which is what the viper versions need.
+COLOR_X = (1181, 380, 385)
+COLOR_Y = (609, 1285, 154)
+COLOR_Z = (55, 145, 2030)
+COLOR_ROW = 5   # code, min_x, max_x, min_y, max_y
+
+
+def color_table(c=ColorSensorConfig):
+    """Classification boxes of c (ColorSensorConfig or a subclass) as
+    array('h') rows of (code, min_x, max_x, min_y, max_y) in 1/1000 units,
+    checked in order.
+    """
+    boxes = (
+        (c.COLOR_RED, c.MIN_X_RED, c.MAX_X_RED, c.MIN_Y_RED, c.MAX_Y_RED),
+        (c.COLOR_GREEN, c.MIN_X_GREEN, c.MAX_X_GREEN, c.MIN_Y_GREEN, c.MAX_Y_GREEN),
+        (c.COLOR_BLUE, c.MIN_X_BLUE, c.MAX_X_BLUE, c.MIN_Y_BLUE, c.MAX_Y_BLUE),
+        (c.COLOR_WHITE, c.MIN_X_WHITE, c.MAX_X_WHITE, c.MIN_Y_WHITE, c.MAX_Y_WHITE),
+        (c.COLOR_YELLOW, c.MIN_X_YELLOW, c.MAX_X_YELLOW, c.MIN_Y_YELLOW, c.MAX_Y_YELLOW),
+        (c.COLOR_ORANGE, c.MIN_X_ORANGE, c.MAX_X_ORANGE, c.MIN_Y_ORANGE, c.MAX_Y_ORANGE),
+        (c.COLOR_PURPLE, c.MIN_X_PURPLE, c.MAX_X_PURPLE, c.MIN_Y_PURPLE, c.MAX_Y_PURPLE),
+    )
+    table = array.array('h')
+    for code, x0, x1, y0, y1 in boxes:
+        table.append(code)
+        table.append(int(round(x0 * 1000)))
+        table.append(int(round(x1 * 1000)))
+        table.append(int(round(y0 * 1000)))
+        table.append(int(round(y1 * 1000)))
+    return table
+
+
+def py_s16(value):
+    return -(value & 0x8000) | (value & 0x7fff)
+
+
+def py_copy_bytes(dst, src, n):
+    for i in range(n):
+        dst[i] = src[i]
+
+
+def py_decode_be16(buf, offset):
+    v = (buf[offset] << 8) | buf[offset + 1]
+    return -(v & 0x8000) | (v & 0x7fff)
+
+
+def py_decode_s8(buf, offset):
+    v = buf[offset]
+    return -(v & 0x80) | (v & 0x7f)
+
+
+def py_color_classify(r, g, b, table, rows, lost):
+    if (r <= lost) and (g <= lost) and (b <= lost):
+        return ColorSensorConfig.COLOR_UNDEF
+    X = COLOR_X[0] * r + COLOR_X[1] * g + COLOR_X[2] * b
+    Y = COLOR_Y[0] * r + COLOR_Y[1] * g + COLOR_Y[2] * b
+    S = X + Y + COLOR_Z[0] * r + COLOR_Z[1] * g + COLOR_Z[2] * b
+    if S == 0:
+        return ColorSensorConfig.COLOR_UNDEF
+    # x >= min  <=>  X * 1000 >= min * S, so no division is needed
+    X *= 1000
+    Y *= 1000
+    i = 0
+    for _ in range(rows):
+        if (X >= table[i + 1] * S) and (X <= table[i + 2] * S) and \
+           (Y >= table[i + 3] * S) and (Y <= table[i + 4] * S):
+            return table[i]
+        i += COLOR_ROW
+    return ColorSensorConfig.COLOR_UNDEF
+
+
+def color_xy(r, g, b):
+    """Chromaticity (x, y) in 1/1000 units from the same integer matrix;
+    tools/colorcal.py mirrors this so tables fit on the host match.
+    """
+    X = COLOR_X[0] * r + COLOR_X[1] * g + COLOR_X[2] * b
+    Y = COLOR_Y[0] * r + COLOR_Y[1] * g + COLOR_Y[2] * b
+    S = X + Y + COLOR_Z[0] * r + COLOR_Z[1] * g + COLOR_Z[2] * b
+    if S == 0:
+        return 0, 0
+    return X * 1000 // S, Y * 1000 // S
+
+
+def color_lookup(r, g, b, grid, x0, y0, step, width, height, lost):
+    """Color code from a calibration grid: one cell per step x step
+    (1/1000 units) starting at (x0, y0), row-major, width x height bytes.
+    """
+    if (r <= lost) and (g <= lost) and (b <= lost):
+        return ColorSensorConfig.COLOR_UNDEF
+    x, y = color_xy(r, g, b)
+    ix = (x - x0) // step
+    iy = (y - y0) // step
+    if (ix < 0) or (iy < 0) or (ix >= width) or (iy >= height):
+        return ColorSensorConfig.COLOR_UNDEF
+    return grid[iy * width + ix]
+
+
+s16 = py_s16
+copy_bytes = py_copy_bytes
+decode_be16 = py_decode_be16
+decode_s8 = py_decode_s8
+color_classify = py_color_classify
+EMITTER = 'python'
+
+try:
+    from .fastpath_viper import s16, copy_bytes, decode_be16, decode_s8, color_classify
+    EMITTER = 'viper'
+except (ImportError, SyntaxError, NotImplementedError, AttributeError):
+    # firmware built without the native emitters; the decorators are then
+    # plain attribute lookups that fail on the micropython module
+    pass
+
+
+def _time(fn, args, n):
+    start = time.ticks_us()
+    for _ in range(n):
+        fn(*args)
+    return time.ticks_diff(time.ticks_us(), start) / n
+
+
+def bench(n=1000):
+    """Print microseconds per call, pure Python vs EMITTER."""
+    buf = bytearray(b'\x0f\xfc\x40\x01\x80\x7f\xc0')
+    dst = bytearray(32)
+    table = color_table()
+    rows = len(table) // COLOR_ROW
+    cases = (
+        ('s16', py_s16, s16, (0xfc40,)),
+        ('copy_bytes(7)', py_copy_bytes, copy_bytes, (dst, buf, 7)),
+        ('decode_be16', py_decode_be16, decode_be16, (buf, 1)),
+        ('decode_s8', py_decode_s8, decode_s8, (buf, 1)),
+        ('color_classify', py_color_classify, color_classify,
+         (160, 110, 90, table, rows, ColorSensorConfig.LOST_THRESHOLD)),
+    )
+    print('function python_us', EMITTER + '_us', 'speedup')
+    for name, slow, fast, args in cases:
+        a = _time(slow, args, n)
+        b = _time(fast, args, n)
+        print(name, a, b, a / b if b else 0)
@@ -0,0 +1,56 @@
+"""Viper variants of fastpath. Importing this module fails on firmware
+without the native emitters, and fastpath then keeps its pure-Python
+versions.
+"""
+import micropython
+
+
+@micropython.viper
+def s16(value: int) -> int:
+    return -(value & 0x8000) | (value & 0x7fff)
+
+
+@micropython.viper
+def copy_bytes(dst, src, n: int):
+    d = ptr8(dst)
+    s = ptr8(src)
+    i = 0
+    while i < n:
+        d[i] = s[i]
+        i += 1
+
+
+@micropython.viper
+def decode_be16(buf, offset: int) -> int:
+    p = ptr8(buf)
+    v = (p[offset] << 8) | p[offset + 1]
+    return -(v & 0x8000) | (v & 0x7fff)
+
+
+@micropython.viper
+def decode_s8(buf, offset: int) -> int:
+    v = ptr8(buf)[offset]
+    return -(v & 0x80) | (v & 0x7f)
+
+
+@micropython.viper
+def color_classify(r: int, g: int, b: int, table, rows: int, lost: int) -> int:
+    # Same arithmetic as fastpath.py_color_classify, constants inlined
+    if (r <= lost) and (g <= lost) and (b <= lost):
+        return 0
+    X = 1181 * r + 380 * g + 385 * b
+    Y = 609 * r + 1285 * g + 154 * b
+    S = X + Y + 55 * r + 145 * g + 2030 * b
+    if S == 0:
+        return 0
+    X *= 1000
+    Y *= 1000
+    t = ptr16(table)
+    i = 0
+    while rows > 0:
+        if (X >= t[i + 1] * S) and (X <= t[i + 2] * S) and \
+           (Y >= t[i + 3] * S) and (Y <= t[i + 4] * S):
+            return t[i]
+        i += 5
+        rows -= 1
+    return 0
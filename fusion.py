@@ -0,0 +1,107 @@
+"""Integer fixed-point orientation from Accelerometer + Gyro.
+
+Angles are in centidegrees. Nothing here uses floats, so update() is
+cheap enough to run from a ControlLoop step.
+"""
+
+_FRAC = 4           # estimates are kept as centidegrees << _FRAC
+_ALPHA_ONE = 1024   # alpha is a Q10 fraction
+
+
+def isqrt(n):
+    if n <= 0:
+        return 0
+    x = n
+    y = (x + 1) >> 1
+    while y < x:
+        x = y
+        y = (x + n // x) >> 1
+    return x
+
+
+def _atan_unit(z):
+    # atan(z) for z = 0..4096 (Q12 of 0..1), result in centidegrees;
+    # pi/4*z + 0.273*z*(1-z), max error about 0.25 degree
+    return ((4500 * z) >> 12) + ((1564 * ((z * (4096 - z)) >> 12)) >> 12)
+
+
+def atan2_cdeg(y, x):
+    """atan2 in centidegrees (-18000..18000) using integers only."""
+    if x == 0 and y == 0:
+        return 0
+    ax = -x if x < 0 else x
+    ay = -y if y < 0 else y
+    if ax >= ay:
+        a = _atan_unit((ay << 12) // ax)
+    else:
+        a = 9000 - _atan_unit((ax << 12) // ay)
+    if x < 0:
+        a = 18000 - a
+    if y < 0:
+        a = -a
+    return a
+
+
+class ComplementaryFilter():
+    """Roll/pitch complementary filter.
+
+    Call update() at rate_hz. The gyro rate is integrated and blended with
+    the accelerometer tilt: est = alpha * (est + gyro * dt) + (1 - alpha) * acc,
+    with alpha a Q10 fraction (1004 is about 0.98). The gyro X/Y axes are
+    assumed to be aligned with the accelerometer X/Y axes.
+    """
+
+    def __init__(self, acc, gyro, rate_hz, *, alpha=1004):
+        if rate_hz <= 0:
+            raise ValueError('rate_hz must be more than 0')
+        if not (0 <= alpha <= _ALPHA_ONE):
+            raise ValueError('alpha is in range 0-1024')
+        self._acc = acc
+        self._gyro = gyro
+        self.alpha = alpha
+        self.dt_us = 1000000 // rate_hz
+
+        # gyro count -> estimate units per update as (count * k) >> shift,
+        # with k small enough that a full scale count stays a small int
+        shift = 16
+        while True:
+            k = (gyro.sensitivity_udps * self.dt_us * (100 << _FRAC) << shift) // 10 ** 12
+            if (k < 16384) or (shift == 0):
+                break
+            shift -= 1
+        self._k = k
+        self._shift = shift
+        self.reset()
+
+    def reset(self):
+        self._roll = 0
+        self._pitch = 0
+        self._started = False
+
+    def _blend(self, est, rate, acc):
+        est += (rate * self._k) >> self._shift
+        diff = acc - est
+        if (diff > (18000 << _FRAC)) or (diff < -(18000 << _FRAC)):
+            # crossed +-180 degrees, follow the accelerometer
+            return acc
+        return (self.alpha * est + (_ALPHA_ONE - self.alpha) * acc) >> 10
+
+    def update(self):
+        ax, ay, az = self._acc.get_raw_values()
+        gx, gy, gz = self._gyro.get_raw_values()
+
+        acc_roll = atan2_cdeg(ay, az) << _FRAC
+        acc_pitch = atan2_cdeg(-ax, isqrt(ay * ay + az * az)) << _FRAC
+
+        if not self._started:
+            self._roll = acc_roll
+            self._pitch = acc_pitch
+            self._started = True
+        else:
+            self._roll = self._blend(self._roll, gx, acc_roll)
+            self._pitch = self._blend(self._pitch, gy, acc_pitch)
+        return self._roll >> _FRAC, self._pitch >> _FRAC
+
+    def get_angles(self):
+        """(roll, pitch) in centidegrees from the last update()."""
+        return self._roll >> _FRAC, self._pitch >> _FRAC
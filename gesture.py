@@ -0,0 +1,92 @@
+from .const import Gesture
+from .fusion import atan2_cdeg, isqrt
+import array
+
+
+class GestureDetector(Gesture):
+    """Streaming shake / free-fall / tilt / flip detection.
+
+    feed() takes one accelerometer sample in mg. The acceleration
+    magnitude goes into a fixed circular window whose sum and sum of
+    squares are updated in place, so mean, variance and the tilt angles
+    cost O(1) per sample and nothing is allocated.
+
+    feed() returns a Gesture code when the detected state changes and
+    Gesture.NONE otherwise; callback, if set, is called with the same code.
+    """
+
+    def __init__(self, window=32, *, shake_cg=50, freefall_cg=30,
+                 tilt_cdeg=3000, callback=None):
+        if not (1 <= window <= 256):
+            raise ValueError('window is in range 1-256')
+        # magnitudes are kept in 1/100 g so window sums stay small ints
+        self._mags = array.array('H', bytearray(2 * window))
+        self._idx = 0
+        self._fill = 0
+        self._sum = 0
+        self._sumsq = 0
+        self.shake_var = shake_cg * shake_cg
+        self.freefall_cg = freefall_cg
+        self.tilt_cdeg = tilt_cdeg
+        self.callback = callback
+
+        self.magnitude = 0
+        self.mean = 0
+        self.variance = 0
+        self.roll = 0
+        self.pitch = 0
+        self.state = Gesture.NONE
+
+    def feed(self, x, y, z):
+        m = isqrt(x * x + y * y + z * z) // 10
+        if m > 0xffff:
+            m = 0xffff
+
+        old = self._mags[self._idx]
+        self._mags[self._idx] = m
+        self._idx += 1
+        if self._idx >= len(self._mags):
+            self._idx = 0
+        if self._fill < len(self._mags):
+            self._fill += 1
+            old = 0
+        self._sum += m - old
+        self._sumsq += m * m - old * old
+
+        self.magnitude = m
+        self.mean = self._sum // self._fill
+        self.variance = self._sumsq // self._fill - self.mean * self.mean
+        self.roll = atan2_cdeg(y, z)
+        self.pitch = atan2_cdeg(-x, isqrt(y * y + z * z))
+
+        state = self._classify()
+        if state == self.state:
+            return Gesture.NONE
+        self.state = state
+        if self.callback is not None:
+            self.callback(state)
+        return state
+
+    def feed_from(self, acc):
+        """feed() one sample of a parts.Accelerometer, in integer math."""
+        x, y, z = acc.get_raw_values()
+        k = acc._mg_q6
+        return self.feed((x * k) >> 6, (y * k) >> 6, (z * k) >> 6)
+
+    def _classify(self):
+        if self.variance >= self.shake_var:
+            return Gesture.SHAKE
+        if self.magnitude <= self.freefall_cg:
+            return Gesture.FREEFALL
+        tilt = self.tilt_cdeg
+        if (self.roll >= 18000 - tilt) or (self.roll <= tilt - 18000):
+            return Gesture.FACE_DOWN
+        if self.pitch >= tilt:
+            return Gesture.TILT_FORWARD
+        if self.pitch <= -tilt:
+            return Gesture.TILT_BACK
+        if self.roll >= tilt:
+            return Gesture.TILT_RIGHT
+        if self.roll <= -tilt:
+            return Gesture.TILT_LEFT
+        return Gesture.FACE_UP
@@ -0,0 +1,92 @@
+import time
+import ustruct
+
+MAGIC = b'ARLG'
+VERSION = 1
+NAME_LENGTH = 8
+
+
+class SensorLog():
+    """Fixed-record binary sensor log on flash.
+
+    channels is a sequence of (name, scale). A value v is stored as the
+    int16 round(v / scale), so ('ax', 0.001) keeps an accelerometer axis in
+    mg. Each record is a '<I' ticks_ms stamp followed by one '<h' per
+    channel. Records are collected in a preallocated block and written to
+    the file one whole block at a time.
+
+    File layout: '<4sBBHH' magic, version, channel count, record size and
+    header size, then '<8sf' name and scale for every channel, then the
+    records. tools/logreader.py opens it on the host.
+    """
+
+    def __init__(self, path, channels, *, block_size=4096):
+        n = len(channels)
+        if n == 0 or n > 255:
+            raise ValueError('channels must be 1-255')
+        self.record_size = 4 + 2 * n
+        records = block_size // self.record_size
+        if records < 1:
+            raise ValueError('block_size is smaller than one record')
+
+        self._n = n
+        self._inv_scale = [1 / scale for _, scale in channels]
+        self._buf = bytearray(records * self.record_size)
+        self._mv = memoryview(self._buf)
+        self._pos = 0
+        self.count = 0
+
+        header_size = 10 + (NAME_LENGTH + 4) * n
+        header = bytearray(header_size)
+        ustruct.pack_into('<4sBBHH', header, 0, MAGIC, VERSION, n,
+                          self.record_size, header_size)
+        offset = 10
+        for name, scale in channels:
+            ustruct.pack_into('<8sf', header, offset, name.encode()[:NAME_LENGTH], scale)
+            offset += NAME_LENGTH + 4
+        self._file = open(path, 'wb')
+        self._file.write(header)
+
+    def append(self, *groups):
+        """Add one record built from the given values in channel order.
+
+        Each group is a number or a sequence of numbers, so
+        log.append(acc.get_values(), color.get_values()[:3], sensor.get_value())
+        fills the channels in turn.
+        """
+        buf = self._buf
+        start = self._pos
+        pos = start + 4
+        i = 0
+        for group in groups:
+            if isinstance(group, (int, float)):
+                group = (group,)
+            for v in group:
+                if i >= self._n:
+                    raise ValueError('too many values for the channels')
+                v = int(round(v * self._inv_scale[i]))
+                if v > 32767:
+                    v = 32767
+                elif v < -32768:
+                    v = -32768
+                ustruct.pack_into('<h', buf, pos, v)
+                pos += 2
+                i += 1
+        if i != self._n:
+            raise ValueError('too few values for the channels')
+        ustruct.pack_into('<I', buf, start, time.ticks_ms())
+
+        self._pos = pos
+        self.count += 1
+        if self._pos >= len(buf):
+            self.flush()
+
+    def flush(self):
+        if self._pos:
+            self._file.write(self._mv[:self._pos])
+            self._pos = 0
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
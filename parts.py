@@ -24,8 +24,10 @@ Kenji Kawase, Artec Co., Ltd.
 ------------------------------------------------------------------------------
 """
 from micropython import const
-from . import body, wire
-from .const import Tone, DCCntrl, ACCConfig, ColorSensorConfig
+from . import body, wire, pwm, pattern, timers, fastpath
+from .fusion import isqrt
+from .const import Tone, DCCntrl, ACCConfig, ColorSensorConfig, GyroConfig
+import array
 import time
 import ustruct
 import machine
@@ -50,22 +52,23 @@ class InputParts():
 
 
 class OutputParts():
+    __CONNECTORS = {'P13': body.p13, 'P14': body.p14, 'P15': body.p15, 'P16': body.p16}
+
     def __init__(self, pin):
 
         if type(pin) is str:
-            if pin is 'P13':
-                pin = body.p13
-            elif pin is 'P14':
-                pin = body.p14
-            elif pin is 'P15':
-                pin = body.p15
-            elif pin is 'P16':
-                pin = body.p16
-            else:
+            if pin not in OutputParts.__CONNECTORS:
                 raise TypeError("This parts can connect only 'P13','P14','P15','P16'")
+            self._connector = pin
+            pin = OutputParts.__CONNECTORS[pin]
         else:
             if not isinstance(pin, body.OutPin):
                 raise TypeError('This parts can connect only p13,p14,p15,p16')
+            self._connector = None
+            for name, p in OutputParts.__CONNECTORS.items():
+                if p is pin:
+                    self._connector = name
+                    break
         self._terminalpin = pin.terminalpin
 
 
@@ -112,6 +115,14 @@ class DCMotor(DCMParts, DCCntrl):
         self.__CTRLBUF = bytearray(1)
         self.__POWRBUF = bytearray(2)
 
+        # Last commanded values and the values actually on the controller
+        self._motion = None
+        self._power = None
+        self._sent_motion = None
+        self._sent_power = None
+        self._min_interval_ms = 0
+        self._last_power_ms = None     # no power sent yet, never hold back
+
     def cw(self):
         self.action(DCMotor.CW)
 
@@ -130,64 +141,92 @@ class DCMotor(DCMParts, DCCntrl):
            (motion != DCMotor.STOP) and
            (motion != DCMotor.BRAKE)):
             raise ValueError('motion: DCMotor.CW/CCW/STOP/BREAK')
-        ustruct.pack_into("<b", self.__CTRLBUF, 0,
-                          DCMotor.__COMMAND[self.__p][motion])
-        self._i2c._i2c.writeto(DCMotor.__ADDRESS, self.__CTRLBUF)
+        self._motion = motion
+        self._sync(False)
 
     def power(self, power):
         if (power > 255) or (power < 0):
             raise ValueError('power is in range 0-255')
-        ustruct.pack_into("<bb", self.__POWRBUF, 0,
-                          DCMotor.__COMMAND[self.__p][4],
-                          power)
-        self._i2c._i2c.writeto(DCMotor.__ADDRESS, self.__POWRBUF)
+        self._power = power
+        self._sync(False)
+
+    def set_rate_limit(self, interval_ms):
+        """Send at most one power change per interval_ms; 0 sends every
+        change.
+
+        Only power writes are limited. A motion change (including stop()
+        and brake()), power(0) and the first power ever set go out at
+        once, and a motion change also sends any pending power. Any other
+        power change inside the interval only replaces the pending value;
+        the latest one goes out on the next cw()/ccw()/power()/flush()
+        call after the interval ends, so call flush() from the main loop
+        when the motor may otherwise not be touched again.
+        """
+        if interval_ms < 0:
+            raise ValueError('interval_ms must be 0 or more')
+        self._min_interval_ms = interval_ms
+
+    def flush(self):
+        """Send a pending coalesced command if the interval has passed."""
+        self._sync(False)
+
+    def refresh(self):
+        """Resend the last commanded motion and power, e.g. after the
+        motor controller has been reset.
+        """
+        self._sync(True)
+
+    def get_state(self):
+        """Last commanded (motion, power); None until first set."""
+        return self._motion, self._power
+
+    def _sync(self, force):
+        now = time.ticks_ms()
+        urgent = force or (self._power == 0) or \
+            ((self._motion is not None) and (self._motion != self._sent_motion))
+        if (not urgent) and self._min_interval_ms and \
+           (self._last_power_ms is not None) and \
+           (time.ticks_diff(now, self._last_power_ms) < self._min_interval_ms):
+            return
+
+        if (self._motion is not None) and (force or self._motion != self._sent_motion):
+            ustruct.pack_into("<b", self.__CTRLBUF, 0,
+                              DCMotor.__COMMAND[self.__p][self._motion])
+            self._i2c._i2c.writeto(DCMotor.__ADDRESS, self.__CTRLBUF)
+            self._sent_motion = self._motion
+
+        if (self._power is not None) and (force or self._power != self._sent_power):
+            ustruct.pack_into("<bb", self.__POWRBUF, 0,
+                              DCMotor.__COMMAND[self.__p][4],
+                              self._power)
+            self._i2c._i2c.writeto(DCMotor.__ADDRESS, self.__POWRBUF)
+            self._sent_power = self._power
+            self._last_power_ms = now
 
 
 class Servomotor(OutputParts):
     __FREQ = 50
     __1DEG = 0.0555556
     __DEG_0 = 2.5
-    __PWMTIMER_FIXED_ID = None
-    __SVM_USED = [False, False, False, False]
 
     def __init__(self, pin):
         super().__init__(pin)
-        if Servomotor.__PWMTIMER_FIXED_ID is None:
-            self.tid = self._terminalpin.get_pwm_timer()
-            Servomotor.__PWMTIMER_FIXED_ID = self.tid
-        else:
-            self.tid = Servomotor.__PWMTIMER_FIXED_ID
-
-        if self._terminalpin.pin == 18:
-            self.svm_num = 0
-        if self._terminalpin.pin == 19:
-            self.svm_num = 1
-        if self._terminalpin.pin == 23:
-            self.svm_num = 2
-        if self._terminalpin.pin == 13:
-            self.svm_num = 3
-
-        self._terminalpin.set_analog_hz(Servomotor.__FREQ, self.tid)
-        Servomotor.__SVM_USED[self.svm_num] = True
+        # All servos share one 50Hz timer
+        self.tid = pwm.pool.allocate(self, Servomotor.__FREQ)
 
     def set_angle(self, degree):
         self._terminalpin.write_analog(degree * Servomotor.__1DEG + Servomotor.__DEG_0)
 
     def release(self):
-        Servomotor.__SVM_USED[self.svm_num] = False
-        self._terminalpin.release_pwm()
-        for f in Servomotor.__SVM_USED:
-            if f:
-                return
-        self._terminalpin.rel_pwm_timer(self.tid)
-        Servomotor.__PWMTIMER_FIXED_ID = None
+        pwm.pool.release(self, self.tid)
 
 
 class Buzzer(OutputParts, Tone):
 
     def __init__(self, pin):
         super().__init__(pin)
-        self.tid = self._terminalpin.get_pwm_timer()
+        # Tones retune the timer, so a buzzer never shares it
+        self.tid = pwm.pool.allocate(self)
 
     def on(self, sound, *, volume=None, duration=None):
         tone = None
@@ -236,8 +275,7 @@ class Buzzer(OutputParts, Tone):
     def release(self):
         # print(self._terminalpin.pin)
         self._terminalpin.write_analog(0)
-        self._terminalpin.rel_pwm_timer(self.tid)
-        self._terminalpin.release_pwm()
+        pwm.pool.release(self, self.tid)
 
 
 Buzzer.TONE_MAP = {
@@ -288,23 +326,171 @@ Buzzer.VOLUME_MAP = {
 
 
 class LED(OutputParts):
+    __FREQ = 1000
+
     def __init__(self, pin):
         super().__init__(pin)
+        self.tid = None
 
     def on(self):
+        self._release_pwm()
         return self._terminalpin.write_digital(1)
 
     def off(self):
+        self._release_pwm()
         return self._terminalpin.write_digital(0)
 
+    def set_brightness(self, level):
+        """Steady PWM brightness, level 0-100."""
+        self._check_level(level)
+        pattern.engine.remove(self)
+        self._attach_pwm()
+        self._terminalpin.write_analog(level)
+
+    def blink(self, period_ms=1000, *, on_ms=None, level=100):
+        """Blink from the shared pattern timer; on_ms defaults to half the period."""
+        self._check_level(level)
+        if on_ms is None:
+            on_ms = period_ms // 2
+        self._attach_pwm()
+        pattern.engine.add(self, pattern.BLINK, period_ms, on_ms, level)
+
+    def breathe(self, period_ms=2000, *, level=100):
+        """Fade up and down once per period_ms from the shared pattern timer."""
+        self._check_level(level)
+        self._attach_pwm()
+        pattern.engine.add(self, pattern.BREATHE, period_ms, 0, level)
+
+    def release(self):
+        self._release_pwm()
+
+    def _check_level(self, level):
+        if (level < 0) or (level > 100):
+            raise ValueError('level must be 0-100')
+
+    def _attach_pwm(self):
+        # All dimmed LEDs share one 1kHz timer
+        if self.tid is None:
+            self.tid = pwm.pool.allocate(self, LED.__FREQ)
+
+    def _release_pwm(self):
+        pattern.engine.remove(self)
+        if self.tid is not None:
+            self._terminalpin.write_analog(0)
+            pwm.pool.release(self, self.tid)
+            self.tid = None
+
 
 class IRPhotoReflector(InputParts):
+    __ENCODERS = []
+    __TIMER = None
+    __TIMER_ID = None
+    __STALE_US = 500000     # no edge for this long means stopped
+
     def __init__(self, pin):
         super().__init__(pin)
+        self.edges = 0
+        self._stamps = None     # edge ring, made by start_encoder()
+        self._head = 0
 
     def get_value(self):
         return int(self._terminalpin.read_analog())
 
+    def start_encoder(self, *, low=1500, high=2500, edges_per_rev=8, ring=16,
+                      sample_hz=2000, timer_id=3):
+        """Use the reflector as a wheel encoder.
+
+        All encoders are sampled by one shared timer at sample_hz (the
+        first start_encoder() call sets the rate). The level is turned into
+        edges with hysteresis: it goes high above high and low below low.
+        Every edge is counted and its ticks_us stamp is stored in a ring of
+        ring entries, from which get_speed()/get_rpm() are derived.
+        """
+        if low >= high:
+            raise ValueError('low must be less than high')
+        if ring < 2:
+            raise ValueError('ring must be 2 or more')
+        self.low = low
+        self.high = high
+        self.edges_per_rev = edges_per_rev
+        self.edges = 0
+        self._stamps = array.array('L', bytearray(4 * ring))
+        self._head = 0
+        self._level = self.get_value() > high
+
+        # claim before registering, so a clash leaves nothing behind
+        if IRPhotoReflector.__TIMER is None:
+            IRPhotoReflector.__TIMER = timers.claim(timer_id, IRPhotoReflector)
+            IRPhotoReflector.__TIMER_ID = timer_id
+            IRPhotoReflector.__TIMER.init(freq=sample_hz, mode=machine.Timer.PERIODIC,
+                                          callback=IRPhotoReflector.__sample_all)
+        if self not in IRPhotoReflector.__ENCODERS:
+            IRPhotoReflector.__ENCODERS.append(self)
+
+    def stop_encoder(self):
+        if self in IRPhotoReflector.__ENCODERS:
+            IRPhotoReflector.__ENCODERS.remove(self)
+        if (not IRPhotoReflector.__ENCODERS) and (IRPhotoReflector.__TIMER is not None):
+            IRPhotoReflector.__TIMER.deinit()
+            timers.release(IRPhotoReflector.__TIMER_ID, IRPhotoReflector)
+            IRPhotoReflector.__TIMER = None
+
+    @staticmethod
+    def __sample_all(t):
+        for enc in IRPhotoReflector.__ENCODERS:
+            enc._sample()
+
+    def _sample(self):
+        v = int(self._terminalpin.read_analog())
+        if self._level:
+            if v >= self.low:
+                return
+            self._level = False
+        else:
+            if v <= self.high:
+                return
+            self._level = True
+        self._stamps[self._head] = time.ticks_us()
+        self._head += 1
+        if self._head >= len(self._stamps):
+            self._head = 0
+        self.edges += 1
+
+    def get_count(self):
+        return self.edges
+
+    def get_period_us(self):
+        """Mean time between the edges in the ring, 0 when stopped or
+        when start_encoder() was never called.
+        """
+        if self._stamps is None:
+            return 0
+        n = self.edges
+        size = len(self._stamps)
+        if n > size:
+            n = size
+        if n < 2:
+            return 0
+        head = self._head
+        newest = self._stamps[head - 1]
+        oldest = self._stamps[(head - n) % size]
+        if time.ticks_diff(time.ticks_us(), newest) > IRPhotoReflector.__STALE_US:
+            return 0
+        return time.ticks_diff(newest, oldest) // (n - 1)
+
+    def get_speed(self):
+        """Edges per second."""
+        period = self.get_period_us()
+        if period <= 0:
+            return 0
+        return 1000000 // period
+
+    def get_rpm(self):
+        period = self.get_period_us()
+        if period <= 0:
+            return 0
+        return 60000000 // (period * self.edges_per_rev)
+
 
 class LightSensor(InputParts):
     def __init__(self, pin):
@@ -315,12 +501,106 @@ class LightSensor(InputParts):
 
 
 class SoundSensor(InputParts):
+    __CAPTURES = []
+    __TIMER = None
+    __TIMER_ID = None
+    __RATE = 0
+
     def __init__(self, pin):
         super().__init__(pin)
+        self._ms = 0
+        self._peak = 0
 
     def get_value(self):
         return int(self._terminalpin.read_analog())
 
+    def start_capture(self, rate_hz=2000, *, block=256, threshold=400,
+                      holdoff_ms=150, timer_id=1):
+        """Sample the sensor at rate_hz from a hardware timer.
+
+        All capturing sensors are sampled by one shared timer; the first
+        start_capture() call sets its rate and timer_id, and a later call
+        asking for another rate raises ValueError.
+
+        Samples go round a preallocated array('H') of block entries
+        (samples). Each sample updates, in O(1): a DC estimate, a running
+        mean square of the AC part for get_rms(), the peak of the current
+        block for get_peak(), and a clap counter that fires when the AC
+        level reaches threshold, at most once per holdoff_ms.
+        """
+        if rate_hz <= 0 or block <= 0:
+            raise ValueError('rate_hz and block must be more than 0')
+        self.stop_capture()
+        if (SoundSensor.__TIMER is not None) and (rate_hz != SoundSensor.__RATE):
+            raise ValueError('sound capture already runs at %d Hz' % SoundSensor.__RATE)
+        self.samples = array.array('H', bytearray(2 * block))
+        self.threshold = threshold
+        self.holdoff_ms = holdoff_ms
+        self.blocks = 0
+        self.claps = 0
+        self.last_clap_ms = time.ticks_ms()
+        self._idx = 0
+        self._dc = -1       # DC level << 6, seeded by the first sample
+        self._ms = 0        # mean square of the AC part << 5
+        self._block_peak = 0
+        self._peak = 0
+
+        if SoundSensor.__TIMER is None:
+            SoundSensor.__TIMER = timers.claim(timer_id, SoundSensor)
+            SoundSensor.__TIMER_ID = timer_id
+            SoundSensor.__RATE = rate_hz
+            SoundSensor.__TIMER.init(freq=rate_hz, mode=machine.Timer.PERIODIC,
+                                     callback=SoundSensor.__sample_all)
+        SoundSensor.__CAPTURES.append(self)
+
+    def stop_capture(self):
+        if self in SoundSensor.__CAPTURES:
+            SoundSensor.__CAPTURES.remove(self)
+        if (not SoundSensor.__CAPTURES) and (SoundSensor.__TIMER is not None):
+            SoundSensor.__TIMER.deinit()
+            timers.release(SoundSensor.__TIMER_ID, SoundSensor)
+            SoundSensor.__TIMER = None
+
+    @staticmethod
+    def __sample_all(t):
+        for sensor in SoundSensor.__CAPTURES:
+            sensor._sample()
+
+    def _sample(self):
+        v = int(self._terminalpin.read_analog())
+        self.samples[self._idx] = v
+
+        if self._dc < 0:
+            self._dc = v << 6
+        self._dc += v - (self._dc >> 6)
+        d = v - (self._dc >> 6)
+        if d < 0:
+            d = -d
+        self._ms += d * d - (self._ms >> 5)
+
+        if d > self._block_peak:
+            self._block_peak = d
+        if d >= self.threshold:
+            now = time.ticks_ms()
+            if time.ticks_diff(now, self.last_clap_ms) >= self.holdoff_ms:
+                self.claps += 1
+                self.last_clap_ms = now
+
+        self._idx += 1
+        if self._idx >= len(self.samples):
+            self._idx = 0
+            self._peak = self._block_peak
+            self._block_peak = 0
+            self.blocks += 1
+
+    def get_rms(self):
+        """Running RMS of the sound level around its DC offset."""
+        return isqrt(self._ms >> 5)
+
+    def get_peak(self):
+        """Largest deviation from the DC offset in the last complete block."""
+        return self._peak
+
 
 class TouchSensor(InputParts):
     def __init__(self, pin):
@@ -386,6 +666,11 @@ class UltrasonicSensor(InputParts):
 
 
 class ColorSensor(I2CParts, ColorSensorConfig):
+    __TABLE = None      # built from the MIN_/MAX_ boxes on first use
+    __TABLE_ROWS = 0
+    __CAL_MAGIC = b'ACAL'
+    __CAL_HEADER = '<4sBBhhhBBB'
+    __CAL_HEADER_SIZE = 15
 
     def __init__(self, pin):
         super().__init__(pin)
@@ -397,6 +682,7 @@ class ColorSensor(I2CParts, ColorSensorConfig):
         self.green = 0
         self.blue = 0
         self.readingdata = [0,0,0,0]
+        self._grid = None
 
     def get_values(self, tt=5):
         try_count = 0
@@ -432,41 +718,86 @@ class ColorSensor(I2CParts, ColorSensorConfig):
 
     def get_colorcode(self):
         self.get_values()
-        self.__clac_xy_code()
-
-        if (self.red <= ColorSensor.LOST_THRESHOLD) and (self.green <= ColorSensor.LOST_THRESHOLD) and \
-            (self.blue <= ColorSensor.LOST_THRESHOLD):
-            return ColorSensor.COLOR_UNDEF
-        if (self.x >= ColorSensor.MIN_X_RED) and (self.x <= ColorSensor.MAX_X_RED) and \
-            (self.y >= ColorSensor.MIN_Y_RED) and (self.y <= ColorSensor.MAX_Y_RED):
-            return ColorSensor.COLOR_RED
-        if (self.x >= ColorSensor.MIN_X_GREEN) and (self.x <= ColorSensor.MAX_X_GREEN) and \
-            (self.y >= ColorSensor.MIN_Y_GREEN) and (self.y <= ColorSensor.MAX_Y_GREEN):
-            return ColorSensor.COLOR_GREEN
-        if (self.x >= ColorSensor.MIN_X_BLUE) and (self.x <= ColorSensor.MAX_X_BLUE) and \
-            (self.y >= ColorSensor.MIN_Y_BLUE) and (self.y <= ColorSensor.MAX_Y_BLUE):
-            return ColorSensor.COLOR_BLUE
-        if (self.x >= ColorSensor.MIN_X_WHITE) and (self.x <= ColorSensor.MAX_X_WHITE) and \
-            (self.y >= ColorSensor.MIN_Y_WHITE) and (self.y <= ColorSensor.MAX_Y_WHITE):
-            return ColorSensor.COLOR_WHITE
-        if (self.x >= ColorSensor.MIN_X_YELLOW) and (self.x <= ColorSensor.MAX_X_YELLOW) and \
-            (self.y >= ColorSensor.MIN_Y_YELLOW) and (self.y <= ColorSensor.MAX_Y_YELLOW):
-            return ColorSensor.COLOR_YELLOW
-        if (self.x >= ColorSensor.MIN_X_ORANGE) and (self.x <= ColorSensor.MAX_X_ORANGE) and \
-            (self.y >= ColorSensor.MIN_Y_ORANGE) and (self.y <= ColorSensor.MAX_Y_ORANGE):
-            return ColorSensor.COLOR_ORANGE
-        if (self.x >= ColorSensor.MIN_X_PURPLE) and (self.x <= ColorSensor.MAX_X_PURPLE) and \
-            (self.y >= ColorSensor.MIN_Y_PURPLE) and (self.y <= ColorSensor.MAX_Y_PURPLE):
-            return ColorSensor.COLOR_PURPLE
-            
-        return ColorSensor.COLOR_UNDEF
+        if self._grid is not None:
+            return fastpath.color_lookup(self.red, self.green, self.blue, self._grid,
+                                         self._cal_x0, self._cal_y0, self._cal_step,
+                                         self._cal_width, self._cal_height, self._cal_lost)
+        if ColorSensor.__TABLE is None:
+            ColorSensor.reload_boxes()
+        return fastpath.color_classify(self.red, self.green, self.blue,
+                                       ColorSensor.__TABLE, ColorSensor.__TABLE_ROWS,
+                                       ColorSensor.LOST_THRESHOLD)
+
+    @staticmethod
+    def reload_boxes():
+        """Rebuild the classification table from the MIN_/MAX_ attributes.
+
+        The boxes are read on the first get_colorcode(); call this after
+        changing them later, e.g. ColorSensor.MIN_X_RED = 0.38.
+        """
+        ColorSensor.__TABLE = fastpath.color_table(ColorSensor)
+        ColorSensor.__TABLE_ROWS = len(ColorSensor.__TABLE) // fastpath.COLOR_ROW
+
+    def record_samples(self, label, count, path, *, interval_ms=20):
+        """Append count labeled samples to path for tools/colorcal.py.
+
+        label is the color code the samples belong to (ColorSensor.COLOR_*).
+        Each sample is 4 bytes: red, green, blue, label.
+        """
+        if (label < ColorSensor.COLOR_UNDEF) or (label > 255):
+            raise ValueError('label must be a color code')
+        record = bytearray(4)
+        record[3] = label
+        with open(path, 'ab') as f:
+            for _ in range(count):
+                self.get_values()
+                record[0] = self.red
+                record[1] = self.green
+                record[2] = self.blue
+                f.write(record)
+                time.sleep_ms(interval_ms)
+
+    def load_calibration(self, path):
+        """Classify with a table made by tools/colorcal.py instead of the
+        built-in ColorSensorConfig boxes. Pass None to go back to the boxes.
+        """
+        if path is None:
+            self._grid = None
+            return
+        with open(path, 'rb') as f:
+            header = f.read(ColorSensor.__CAL_HEADER_SIZE)
+            if len(header) != ColorSensor.__CAL_HEADER_SIZE:
+                raise ValueError('calibration file is too short')
+            magic, version, lost, x0, y0, step, width, height, _ = \
+                ustruct.unpack(ColorSensor.__CAL_HEADER, header)
+            if (magic != ColorSensor.__CAL_MAGIC) or (version != 1):
+                raise ValueError('not a color calibration file')
+            grid = f.read(width * height)
+        if len(grid) != width * height:
+            raise ValueError('calibration file is too short')
+        self._cal_lost = lost
+        self._cal_x0 = x0
+        self._cal_y0 = y0
+        self._cal_step = step
+        self._cal_width = width
+        self._cal_height = height
+        self._grid = grid
+
+    @property
+    def x(self):
+        return self.__clac_xy_code()[0]
+
+    @property
+    def y(self):
+        return self.__clac_xy_code()[1]
 
     def __clac_xy_code(self):
         X = (0.576669) * self.red + (0.185558) * self.green + (0.188229) * self.blue
         Y = (0.297345) * self.red + (0.627364) * self.green + (0.075291) * self.blue
         Z = (0.027031) * self.red + (0.070689) * self.green + (0.991338) * self.blue
-        self.x = X / (X + Y + Z)
-        self.y = Y / (X + Y + Z)
+        if X + Y + Z == 0:
+            return 0, 0
+        return X / (X + Y + Z), Y / (X + Y + Z)
 
     def __i2c_send(self, command):
         # Set to status reg
@@ -483,6 +814,17 @@ __MMA_8653_CTRL_REG1_VALUE_F_READ = const(0x02)
 
 __MMA_8653_CTRL_REG2 = const(0x2B)
 __MMA_8653_CTRL_REG2_RESET = const(0x40)
+__MMA_8653_CTRL_REG2_SLPE = const(0x04)
+
+__MMA_8653_CTRL_REG3 = const(0x2C)
+
+__MMA_8653_CTRL_REG4 = const(0x2D)
+__MMA_8653_CTRL_REG4_INT_EN_ASLP = const(0x80)
+__MMA_8653_CTRL_REG4_INT_EN_LNDPRT = const(0x10)
+__MMA_8653_CTRL_REG4_INT_EN_FF_MT = const(0x04)
+
+__MMA_8653_ASLP_COUNT = const(0x29)
+__MMA_8653_ASLP_STEP_MS = const(320)
 
 __MMA_8653_PL_STATUS = const(0x10)
 __MMA_8653_PL_CFG = const(0x11)
@@ -497,6 +839,11 @@ __MMA_8653_FF_MT_CFG = const(0x15)
 __MMA_8653_FF_MT_CFG_ELE = const(0x80)
 __MMA_8653_FF_MT_CFG_OAE = const(0x40)
 
+__MMA_8653_FF_MT_CFG_XYEFE = const(0x18)   # X and Y only, Z always sees 1g
+
+__MMA_8653_FF_MT_THS = const(0x17)
+__MMA_8653_FF_MT_THS_WAKE = const(0x08)    # 0.063g/LSB -> about 0.5g
+
 __MMA_8653_FF_MT_SRC = const(0x16)
 __MMA_8653_FF_MT_SRC_EA = const(0x80)
 
@@ -516,16 +863,43 @@ __MMA_8653_ODR_12_5 = const(0x28)
 __MMA_8653_ODR_6_25 = const(0x30)
 __MMA_8653_ODR_1_56 = const(0x38)
 
+__MMA_8653_STATUS = const(0x00)
+__MMA_8653_STATUS_ZYXDR = const(0x08)   # new X, Y and Z data ready
+__MMA_8653_STATUS_ZYXOW = const(0x80)   # data overwritten before it was read
+
 
-def s16(value):
-    return -(value & 0x8000) | (value & 0x7fff)
+s16 = fastpath.s16
 
 
 class Accelerometer(I2CParts, ACCConfig):
 
+    __ODRS = (ACCConfig.ODR_800, ACCConfig.ODR_400, ACCConfig.ODR_200,
+              ACCConfig.ODR_100, ACCConfig.ODR_50, ACCConfig.ODR_12_5,
+              ACCConfig.ODR_6_25, ACCConfig.ODR_1_56)
+    __MODES = (ACCConfig.MODE_NORMAL, ACCConfig.MODE_LOW_NOISE_LOW_POWER,
+               ACCConfig.MODE_HIGH_RESOLUTION, ACCConfig.MODE_LOW_POWER)
+    __ASLP_RATES = (ACCConfig.ASLP_50, ACCConfig.ASLP_12_5,
+                    ACCConfig.ASLP_6_25, ACCConfig.ASLP_1_56)
+    __PERIOD_US = {
+        ACCConfig.ODR_800: 1250, ACCConfig.ODR_400: 2500,
+        ACCConfig.ODR_200: 5000, ACCConfig.ODR_100: 10000,
+        ACCConfig.ODR_50: 20000, ACCConfig.ODR_12_5: 80000,
+        ACCConfig.ODR_6_25: 160000, ACCConfig.ODR_1_56: 640000
+    }
+
     def __init__(self, pin):
         super().__init__(pin)
         self.__wire = wire.Wire(self._i2c._i2c)
+        self._odr = ACCConfig.ODR_100
+        self._mode = ACCConfig.MODE_NORMAL
+        self._aslp_rate = None
+        self._sleep_mode = ACCConfig.MODE_LOW_POWER
+        self._sleep_after_ms = 0
+        self._wake = 0
+        self._stat = 0
+        self.seq = 0
+        self.overruns = 0
+        self._last_new_us = time.ticks_us()
         self._begin(False, 2)
 
     def _whoami(self):
@@ -577,9 +951,43 @@ class Accelerometer(I2CParts, ACCConfig):
             f_read = 0
         else:
             f_read = __MMA_8653_CTRL_REG1_VALUE_F_READ
-        self.__wire.write(reg1 | __MMA_8653_CTRL_REG1_VALUE_ACTIVE | f_read | __MMA_8653_ODR_100)
+        aslp_rate = self._aslp_rate if self._aslp_rate is not None else 0
+        self.__wire.write(reg1 | __MMA_8653_CTRL_REG1_VALUE_ACTIVE | f_read | self._odr | aslp_rate)
         self.__wire.endTransmission()
 
+    def _write_register(self, offset, value):
+        self.__wire.beginTransmission(__MMA_8653_ADDRESS)
+        self.__wire.write(offset)
+        self.__wire.write(value)
+        self.__wire.endTransmission()
+
+    def _power_setup(self):
+        # Must be called in standby mode
+        reg2 = self._mode
+        reg4 = 0
+        if self._aslp_rate is not None:
+            reg2 |= __MMA_8653_CTRL_REG2_SLPE | (self._sleep_mode << 3)
+            count = self._sleep_after_ms // __MMA_8653_ASLP_STEP_MS
+            if count < 1:
+                count = 1
+            elif count > 255:
+                count = 255
+            self._write_register(__MMA_8653_ASLP_COUNT, count)
+            reg4 |= __MMA_8653_CTRL_REG4_INT_EN_ASLP
+
+            if self._wake & ACCConfig.WAKE_MOTION:
+                self._write_register(__MMA_8653_FF_MT_CFG,
+                                     __MMA_8653_FF_MT_CFG_ELE | __MMA_8653_FF_MT_CFG_OAE |
+                                     __MMA_8653_FF_MT_CFG_XYEFE)
+                self._write_register(__MMA_8653_FF_MT_THS, __MMA_8653_FF_MT_THS_WAKE)
+                reg4 |= __MMA_8653_CTRL_REG4_INT_EN_FF_MT
+            if self._wake & ACCConfig.WAKE_ORIENTATION:
+                reg4 |= __MMA_8653_CTRL_REG4_INT_EN_LNDPRT
+            self._write_register(__MMA_8653_CTRL_REG3, self._wake)
+
+        self._write_register(__MMA_8653_CTRL_REG2, reg2)
+        self._write_register(__MMA_8653_CTRL_REG4, reg4)
+
     def _begin(self, highres, scale):
         _addr = __MMA_8653_ADDRESS
         self._highres = highres
@@ -593,6 +1001,12 @@ class Accelerometer(I2CParts, ACCConfig):
             self._step_factor *= 2
         elif (scale == 8):
             self._step_factor *= 4
+        # mg per get_raw_values() count << 6, exact for integer users
+        self._mg_q6 = 250 if self._highres else 1000
+        if (scale == 4):
+            self._mg_q6 *= 2
+        elif (scale == 8):
+            self._mg_q6 *= 4
         self.wai = self._read_register(0x0D)    # Get Who Am I from the device.
 
         self.__wire.beginTransmission(_addr)    # Reset
@@ -618,9 +1032,44 @@ class Accelerometer(I2CParts, ACCConfig):
         else:   # Default to 2g mode
             self.__wire.write(__MMA_8653_2G_MODE)
         self.__wire.endTransmission()
+        self._power_setup()
         self._active()
 
-    def configuration(self, highres, scale):
+    def configuration(self, highres, scale, *, odr=ACCConfig.ODR_100,
+                      mode=ACCConfig.MODE_NORMAL, sleep_rate=None,
+                      sleep_mode=ACCConfig.MODE_LOW_POWER, sleep_after_ms=3200,
+                      wake=0):
+        """Configure resolution, range, data rate and power mode.
+
+        odr is one of ACCConfig.ODR_*. mode selects the oversampling mode
+        (ACCConfig.MODE_*): HIGH_RESOLUTION oversamples the most and has the
+        lowest noise and highest current, LOW_POWER oversamples the least
+        and draws the least current, LOW_NOISE_LOW_POWER sits in between.
+
+        Passing sleep_rate (ACCConfig.ASLP_*) enables auto-sleep: after
+        sleep_after_ms (about 320ms steps) without a wake event the device
+        drops to sleep_rate using sleep_mode oversampling. wake is an OR of
+        ACCConfig.WAKE_MOTION and ACCConfig.WAKE_ORIENTATION.
+
+        Sample rate and I2C load when every sample is read once with
+        get_values() (one register write + one burst read; highres reads
+        7 bytes, lowres 4, plus address/register bytes):
+
+        ========  ========  ==========  ==========  ===================
+        odr       period    highres     lowres      bus @100kHz (hi/lo)
+        ========  ========  ==========  ==========  ===================
+        ODR_800   1.25 ms   8000 B/s    5600 B/s    74% / 52%
+        ODR_400   2.5 ms    4000 B/s    2800 B/s    37% / 26%
+        ODR_200   5 ms      2000 B/s    1400 B/s    18% / 13%
+        ODR_100   10 ms     1000 B/s    700 B/s     9.2% / 6.5%
+        ODR_50    20 ms     500 B/s     350 B/s     4.6% / 3.3%
+        ODR_12_5  80 ms     125 B/s     88 B/s      1.2% / 0.8%
+        ODR_6_25  160 ms    63 B/s      44 B/s      0.6% / 0.4%
+        ODR_1_56  640 ms    16 B/s      11 B/s      0.1% / 0.1%
+        ========  ========  ==========  ==========  ===================
+
+        Polling get_values() faster than odr only re-reads the same sample.
+        """
 
         if type(scale) is int:
             if not (scale == 2 or scale == 4 or scale == 8):
@@ -631,6 +1080,21 @@ class Accelerometer(I2CParts, ACCConfig):
         if type(highres) is not bool:
             raise TypeError('higres param is True / False')
 
+        if odr not in Accelerometer.__ODRS:
+            raise ValueError('odr param is ACCConfig.ODR_*')
+        if (mode not in Accelerometer.__MODES) or (sleep_mode not in Accelerometer.__MODES):
+            raise ValueError('mode param is ACCConfig.MODE_*')
+        if (sleep_rate is not None) and (sleep_rate not in Accelerometer.__ASLP_RATES):
+            raise ValueError('sleep_rate param is ACCConfig.ASLP_* or None')
+        if wake & ~(ACCConfig.WAKE_MOTION | ACCConfig.WAKE_ORIENTATION):
+            raise ValueError('wake param is ACCConfig.WAKE_MOTION / WAKE_ORIENTATION')
+
+        self._odr = odr
+        self._mode = mode
+        self._aslp_rate = sleep_rate
+        self._sleep_mode = sleep_mode
+        self._sleep_after_ms = sleep_after_ms
+        self._wake = wake
         self._begin(highres, scale)
 
     def get_x(self):
@@ -646,49 +1110,163 @@ class Accelerometer(I2CParts, ACCConfig):
         self._update()
         return self._xg, self._yg, self._zg
 
+    def get_raw_values(self):
+        """Integer counts (10-bit in highres, 8-bit otherwise) for fixed-point users."""
+        self._update()
+        if self._highres:
+            return self._x >> 6, self._y >> 6, self._z >> 6
+        return self._x, self._y, self._z
+
+    def get_new_values(self):
+        """Return (seq, x, y, z) if a sample arrived since the last call, else None.
+
+        seq counts fresh samples. overruns counts reads where the device
+        reported that a sample had been overwritten before it was read.
+        """
+        stat = self._update()
+        if stat & __MMA_8653_STATUS_ZYXOW:
+            self.overruns += 1
+        if not (stat & __MMA_8653_STATUS_ZYXDR):
+            return None
+        self.seq += 1
+        self._last_new_us = time.ticks_us()
+        return self.seq, self._xg, self._yg, self._zg
+
+    def wait_new(self, timeout_ms=1000):
+        """Block until a fresh sample is ready and return it like get_new_values().
+
+        Sleeps until the next sample is due at the configured odr, then
+        polls the 1-byte status register. Returns None on timeout.
+        """
+        start = time.ticks_ms()
+        period = Accelerometer.__PERIOD_US[self._odr]
+        wait = time.ticks_diff(time.ticks_add(self._last_new_us, period), time.ticks_us())
+        if wait > 0:
+            time.sleep_us(wait)
+
+        poll = period >> 3
+        while True:
+            if self._read_register(__MMA_8653_STATUS) & __MMA_8653_STATUS_ZYXDR:
+                values = self.get_new_values()
+                if values is not None:
+                    return values
+            if (timeout_ms is not None) and (time.ticks_diff(time.ticks_ms(), start) >= timeout_ms):
+                return None
+            time.sleep_us(poll)
+
     def _update(self):
         _addr = __MMA_8653_ADDRESS
         self.__wire.beginTransmission(_addr)    # Set to status reg
-        self.__wire.write(0x00)
+        self.__wire.write(__MMA_8653_STATUS)
         self.__wire.endTransmission(False)
 
         if self._highres:
             q = 7
         else:
             q = 4
+        self._stat = 0
         self.__wire.requestFrom(_addr, q)
         if self.__wire.available():
-            _stat = self.__wire.read()
+            rx = self.__wire.rxBuffer
+            self._stat = rx[0]
             if(self._highres):
                 # rx = (int16_t)((Wire.read() << 8) + Wire.read());
-                self._x = s16((self.__wire.read() << 8) + self.__wire.read())
+                self._x = fastpath.decode_be16(rx, 1)
                 self._xg = (self._x / 64) * self._step_factor
-                # ry = (int16_t)((Wire.read() << 8) + Wire.read());
-                self._y = s16((self.__wire.read() << 8) + self.__wire.read())
+                self._y = fastpath.decode_be16(rx, 3)
                 self._yg = (self._y / 64) * self._step_factor
-                # rz = (int16_t)((Wire.read() << 8) + Wire.read());
-                self._z = s16((self.__wire.read() << 8) + self.__wire.read())
+                self._z = fastpath.decode_be16(rx, 5)
                 self._zg = (self._z / 64) * self._step_factor
             else:
-                """
-                _xg = (int8_t)Wire.read() * _step_factor;
-                _yg = (int8_t)Wire.read() * _step_factor;
-                _zg = (int8_t)Wire.read() * _step_factor;
-                _x = 0;
-                _y = 0;
-                _z = 0;
-                """
-                self._x = s16(self.__wire.read() << 8)
-                self._x = self._x / 256
-                self._y = s16(self.__wire.read() << 8)
-                self._y = self._y / 256
-                self._z = s16(self.__wire.read() << 8)
-                self._z = self._z / 256
+                # _xg = (int8_t)Wire.read() * _step_factor;
+                self._x = fastpath.decode_s8(rx, 1)
+                self._y = fastpath.decode_s8(rx, 2)
+                self._z = fastpath.decode_s8(rx, 3)
                 self._xg = self._x * self._step_factor
                 self._yg = self._y * self._step_factor
                 self._zg = self._z * self._step_factor
+        return self._stat
+
+
+__L3GD20_WHO_AM_I = const(0x0F)
+__L3GD20_CTRL_REG1 = const(0x20)
+__L3GD20_CTRL_REG1_ENABLE = const(0x0F)    # power on, X/Y/Z on, 95Hz
+__L3GD20_CTRL_REG4 = const(0x23)
+__L3GD20_CTRL_REG4_BLE = const(0x40)       # big endian, same decode as MMA8653
+__L3GD20_OUT_X_L = const(0x28)
+__L3GD20_AUTO_INCREMENT = const(0x80)
 
-# class Gyro(I2CParts):
-#  def __init__(self, connector):
-#    raise NotImplementedError
+
+class Gyro(I2CParts, GyroConfig):
+    """3-axis gyro with an L3GD20 compatible register map."""
+    __FS = {GyroConfig.DPS_250: 0x00, GyroConfig.DPS_500: 0x10, GyroConfig.DPS_2000: 0x20}
+    # micro-dps per count
+    __SENSITIVITY = {GyroConfig.DPS_250: 8750, GyroConfig.DPS_500: 17500,
+                     GyroConfig.DPS_2000: 70000}
+
+    def __init__(self, pin, *, address=0x6B):
+        super().__init__(pin)
+        self.__addr = address
+        self.__wire = wire.Wire(self._i2c._i2c)
+        self._x = 0
+        self._y = 0
+        self._z = 0
+        self.configuration(Gyro.DPS_250)
+
+    def configuration(self, scale):
+        if scale not in Gyro.__FS:
+            raise ValueError('scale param is 250, 500, or 2000')
+        self.scale = scale
+        self.sensitivity_udps = Gyro.__SENSITIVITY[scale]
+        self.wai = self._read_register(__L3GD20_WHO_AM_I)
+        self._write_register(__L3GD20_CTRL_REG4, __L3GD20_CTRL_REG4_BLE | Gyro.__FS[scale])
+        self._write_register(__L3GD20_CTRL_REG1, __L3GD20_CTRL_REG1_ENABLE)
+
+    def _read_register(self, offset):
+        self.__wire.beginTransmission(self.__addr)
+        self.__wire.write(offset)
+        self.__wire.endTransmission(False)
+
+        self.__wire.requestFrom(self.__addr, 1)
+        if (self.__wire.available()):
+            return self.__wire.read()
+        return 0
+
+    def _write_register(self, offset, value):
+        self.__wire.beginTransmission(self.__addr)
+        self.__wire.write(offset)
+        self.__wire.write(value)
+        self.__wire.endTransmission()
+
+    def _update(self):
+        # X, Y and Z in one burst read
+        self.__wire.beginTransmission(self.__addr)
+        self.__wire.write(__L3GD20_OUT_X_L | __L3GD20_AUTO_INCREMENT)
+        self.__wire.endTransmission(False)
+
+        self.__wire.requestFrom(self.__addr, 6)
+        if self.__wire.available() >= 6:
+            rx = self.__wire.rxBuffer
+            self._x = fastpath.decode_be16(rx, 0)
+            self._y = fastpath.decode_be16(rx, 2)
+            self._z = fastpath.decode_be16(rx, 4)
+
+    def get_raw_values(self):
+        self._update()
+        return self._x, self._y, self._z
+
+    def get_values(self):
+        """Angular rate in degrees per second."""
+        self._update()
+        k = self.sensitivity_udps / 1000000
+        return self._x * k, self._y * k, self._z * k
+
+    def get_x(self):
+        return self.get_values()[0]
+
+    def get_y(self):
+        return self.get_values()[1]
+
+    def get_z(self):
+        return self.get_values()[2]
 
@@ -0,0 +1,115 @@
+from . import timers
+import array
+import machine
+
+STEADY = 0
+BLINK = 1
+BREATHE = 2
+
+_ROW = 6    # mode, period, on, level, phase, last written level
+_MODE = 0
+_PERIOD = 1
+_ON = 2
+_LEVEL = 3
+_PHASE = 4
+_LAST = 5
+
+
+class PatternEngine():
+    """Drive blink/breathe patterns of several LEDs from one timer.
+
+    Every LED has a row of halfwords in a single array('H') table, with
+    times in ticks of tick_ms. One timer callback steps all rows and only
+    writes the PWM duty of an LED when its level changes. The timer runs
+    only while at least one pattern is active.
+    """
+
+    def __init__(self, *, tick_ms=20, timer_id=2, max_leds=4):
+        self.tick_ms = tick_ms
+        self._timer_id = timer_id
+        self._timer = None
+        self._leds = [None] * max_leds
+        self._table = array.array('H', bytearray(2 * _ROW * max_leds))
+        self._tick_cb = self._tick
+
+    def add(self, led, mode, period_ms, on_ms, level):
+        period = period_ms // self.tick_ms
+        if period < 1:
+            period = 1
+        on = on_ms // self.tick_ms
+        slot = self._slot(led)
+        if slot < 0:
+            raise RuntimeError('too many LED patterns')
+        timer = self._timer
+        if timer is None:
+            # claim before taking the slot, so a clash leaves nothing behind
+            timer = timers.claim(self._timer_id, self)
+        self._leds[slot] = led
+        base = slot * _ROW
+        t = self._table
+        t[base + _MODE] = mode
+        t[base + _PERIOD] = period
+        t[base + _ON] = on
+        t[base + _LEVEL] = level
+        t[base + _PHASE] = 0
+        t[base + _LAST] = 0xffff    # force the first write
+        if self._timer is None:
+            self._timer = timer
+            timer.init(period=self.tick_ms, mode=machine.Timer.PERIODIC,
+                       callback=self._tick_cb)
+
+    def remove(self, led):
+        for i in range(len(self._leds)):
+            if self._leds[i] is led:
+                self._leds[i] = None
+        for led in self._leds:
+            if led is not None:
+                return
+        if self._timer is not None:
+            self._timer.deinit()
+            timers.release(self._timer_id, self)
+            self._timer = None
+
+    def _slot(self, led):
+        free = -1
+        for i in range(len(self._leds)):
+            if self._leds[i] is led:
+                return i
+            if (self._leds[i] is None) and (free < 0):
+                free = i
+        return free
+
+    def _tick(self, t):
+        table = self._table
+        for i in range(len(self._leds)):
+            led = self._leds[i]
+            if led is None:
+                continue
+            base = i * _ROW
+            period = table[base + _PERIOD]
+            phase = table[base + _PHASE]
+            level = table[base + _LEVEL]
+            mode = table[base + _MODE]
+            if mode == BLINK:
+                out = level if phase < table[base + _ON] else 0
+            elif mode == BREATHE:
+                half = period >> 1
+                if half == 0:
+                    out = level
+                elif phase < half:
+                    out = level * phase // half
+                else:
+                    out = level * (period - phase) // half
+            else:
+                out = level
+
+            phase += 1
+            if phase >= period:
+                phase = 0
+            table[base + _PHASE] = phase
+            if out != table[base + _LAST]:
+                table[base + _LAST] = out
+                led._terminalpin.write_analog(out)
+
+
+engine = PatternEngine()
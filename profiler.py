@@ -0,0 +1,117 @@
+from . import parts
+import array
+import time
+import ustruct
+
+MAX_SLOTS = 64
+
+# Public methods wrapped by enable() when no targets are given
+TARGETS = (
+    (parts.DCMotor, ('cw', 'ccw', 'stop', 'brake', 'action', 'power')),
+    (parts.Servomotor, ('set_angle', 'release')),
+    (parts.Buzzer, ('on', 'off', 'release')),
+    (parts.LED, ('on', 'off', 'set_brightness', 'blink', 'breathe')),
+    (parts.IRPhotoReflector, ('get_value', 'get_speed', 'get_rpm')),
+    (parts.LightSensor, ('get_value',)),
+    (parts.SoundSensor, ('get_value',)),
+    (parts.TouchSensor, ('get_value', 'is_pressed')),
+    (parts.Temperature, ('get_value', 'get_celsius')),
+    (parts.UltrasonicSensor, ('get_pulse_time', 'get_distance')),
+    (parts.ColorSensor, ('get_values', 'get_colorcode')),
+    (parts.Accelerometer, ('get_x', 'get_y', 'get_z', 'get_values',
+                           'get_new_values', 'wait_new')),
+)
+
+_names = []
+_originals = []     # (cls, name, function) to put back on disable()
+_count = array.array('L', bytearray(4 * MAX_SLOTS))
+_total = array.array('L', bytearray(4 * MAX_SLOTS))
+_min = array.array('L', bytearray(4 * MAX_SLOTS))
+_max = array.array('L', bytearray(4 * MAX_SLOTS))
+
+
+def _wrap(func, slot):
+    def wrapper(*args, **kwargs):
+        start = time.ticks_us()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            t = time.ticks_diff(time.ticks_us(), start)
+            _count[slot] += 1
+            _total[slot] += t
+            if t < _min[slot]:
+                _min[slot] = t
+            if t > _max[slot]:
+                _max[slot] = t
+    return wrapper
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def enable(targets=TARGETS):
+    """Wrap the public methods of the parts classes with timing probes.
+
+    targets is a sequence of (class, method names). Slots are
+    preallocated, so a probe only updates four array entries per call.
+    """
+    if _originals:
+        return
+    for cls, methods in targets:
+        for name in methods:
+            func = getattr(cls, name, None)
+            if func is None:
+                continue
+            slot = len(_names)
+            if slot >= MAX_SLOTS:
+                raise RuntimeError('profiler slots are full')
+            _names.append(cls.__name__ + '.' + name)
+            _originals.append((cls, name, func))
+            setattr(cls, name, _wrap(func, slot))
+    reset()
+
+
+def disable():
+    """Put the original methods back so profiling costs nothing."""
+    for cls, name, func in _originals:
+        setattr(cls, name, func)
+    _originals.clear()
+    _names.clear()
+
+
+def reset():
+    for i in range(MAX_SLOTS):
+        _count[i] = 0
+        _total[i] = 0
+        _min[i] = 0xffffffff
+        _max[i] = 0
+
+
+def snapshot():
+    """List of (name, count, min_us, mean_us, max_us) for called methods."""
+    result = []
+    for i in range(len(_names)):
+        n = _count[i]
+        if n:
+            result.append((_names[i], n, _min[i], _total[i] // n, _max[i]))
+    return result
+
+
+def dump():
+    print('method count min_us mean_us max_us')
+    for name, n, lo, mean, hi in snapshot():
+        print(name, n, lo, mean, hi)
+
+
+def dump_bin():
+    """Pack snapshot() as '<H' record count followed by, per record,
+    '<B' name length, the name, and '<IIII' count/min/mean/max.
+    """
+    records = snapshot()
+    buf = bytearray(ustruct.pack('<H', len(records)))
+    for name, n, lo, mean, hi in records:
+        buf.extend(ustruct.pack('<B', len(name)))
+        buf.extend(name.encode())
+        buf.extend(ustruct.pack('<IIII', n, lo, mean, hi))
+    return bytes(buf)
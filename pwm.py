@@ -0,0 +1,54 @@
+class PWMTimerPool():
+    """Central owner of the PWM timers used by the output parts.
+
+    Outputs that run at a fixed frequency (servos at 50Hz, dimmed LEDs)
+    share one timer per frequency class. Outputs that retune their timer,
+    such as a Buzzer playing notes, ask for freq=None and get a timer of
+    their own.
+    """
+
+    def __init__(self):
+        # tid -> [freq or None, [(connector, part), ...]]
+        self._timers = {}
+
+    def allocate(self, part, freq=None):
+        tp = part._terminalpin
+        if freq is not None:
+            for tid, entry in self._timers.items():
+                if entry[0] == freq:
+                    entry[1].append((part._connector, part))
+                    tp.set_analog_hz(freq, tid)
+                    return tid
+
+        tid = tp.get_pwm_timer()
+        self._timers[tid] = [freq, [(part._connector, part)]]
+        if freq is not None:
+            tp.set_analog_hz(freq, tid)
+        return tid
+
+    def release(self, part, tid):
+        tp = part._terminalpin
+        tp.release_pwm()
+        entry = self._timers.get(tid)
+        if entry is None:
+            return
+        owners = entry[1]
+        for i in range(len(owners)):
+            if owners[i][1] is part:
+                del owners[i]
+                break
+        if not owners:
+            tp.rel_pwm_timer(tid)
+            del self._timers[tid]
+
+    def owners(self):
+        """List of (tid, freq, connectors) for every timer in use.
+
+        freq is None for a timer held exclusively by a variable-frequency
+        output.
+        """
+        return [(tid, entry[0], [c for c, _ in entry[1]])
+                for tid, entry in self._timers.items()]
+
+
+pool = PWMTimerPool()
@@ -0,0 +1,124 @@
+class RegisterModel():
+    """Simulated register-pointer I2C device.
+
+    Stands in for the StuduinoBitI2C bus of an I2C part so drivers such as
+    Gyro, Accelerometer and fusion.ComplementaryFilter can be exercised
+    without the hardware. Like StuduinoBitI2C it exposes the underlying
+    bus as _i2c (itself here), which is what the drivers talk to:
+
+        model = RegisterModel(0x6B, increment_bit=0x80)
+        model.set_word(0x28, 1000)
+        gyro = parts.Gyro(body.I2CPin(model))
+
+    selftest() runs the Gyro and the filter against such models.
+
+    A write sets the register pointer from its first byte and stores the
+    remaining bytes; a read returns bytes from the pointer onwards. With
+    increment_bit the pointer only advances when that bit is set in the
+    register address (L3GD20 style), otherwise it always advances
+    (MMA8653 style).
+    """
+
+    def __init__(self, address, *, size=256, increment_bit=None):
+        self.address = address
+        self._i2c = self
+        self.regs = bytearray(size)
+        self._increment_bit = increment_bit
+        self._ptr = 0
+        self._inc = True
+        self.writes = 0
+        self.reads = 0
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def _check(self, addr):
+        if addr != self.address:
+            raise OSError(19)   # ENODEV
+
+    def writeto(self, addr, buf, stop=True):
+        self._check(addr)
+        self.writes += 1
+        if len(buf) == 0:
+            return 0
+        reg = buf[0]
+        self._inc = True
+        if self._increment_bit is not None:
+            self._inc = bool(reg & self._increment_bit)
+            reg &= ~self._increment_bit
+        self._ptr = reg
+        for i in range(1, len(buf)):
+            self.regs[self._ptr] = buf[i]
+            self._advance()
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        self._check(addr)
+        self.reads += 1
+        data = bytearray(nbytes)
+        for i in range(nbytes):
+            data[i] = self.regs[self._ptr]
+            self._advance()
+        return bytes(data)
+
+    def _advance(self):
+        if self._inc:
+            self._ptr = (self._ptr + 1) % len(self.regs)
+
+    def set_word(self, reg, value, big_endian=True):
+        value &= 0xffff
+        hi = value >> 8
+        lo = value & 0xff
+        if big_endian:
+            self.regs[reg] = hi
+            self.regs[reg + 1] = lo
+        else:
+            self.regs[reg] = lo
+            self.regs[reg + 1] = hi
+
+
+def selftest():
+    """Check Gyro burst reads and ComplementaryFilter.update() against
+    register models; raises AssertionError on failure.
+    """
+    from . import body, parts, fusion
+
+    gyro_model = RegisterModel(0x6B, increment_bit=0x80)
+    gyro = parts.Gyro(body.I2CPin(gyro_model))
+    gyro_model.set_word(0x28, 1000)
+    gyro_model.set_word(0x2A, -2000)
+    gyro_model.set_word(0x2C, 3)
+    reads = gyro_model.reads
+    assert gyro.get_raw_values() == (1000, -2000, 3)
+    assert gyro_model.reads == reads + 1, 'X/Y/Z must come in one burst read'
+
+    # MMA8653 auto-increments every read; lowres data is one byte per axis
+    acc_model = RegisterModel(0x1D)
+    acc = parts.Accelerometer(body.I2CPin(acc_model))
+    acc_model.regs[0] = 0x08    # ZYXDR
+    acc_model.regs[1] = 0
+    acc_model.regs[2] = 0
+    acc_model.regs[3] = 64      # +1g at 2g range
+
+    for reg in (0x28, 0x2A, 0x2C):
+        gyro_model.set_word(reg, 0)
+    f = fusion.ComplementaryFilter(acc, gyro, 100)
+    assert f.update() == (0, 0), 'level and still must read (0, 0)'
+
+    # gyro rolling at 1000 counts (8.75 dps): integrated, then blended
+    gyro_model.set_word(0x28, 1000)
+    roll, pitch = f.update()
+    assert 0 < roll < 9, roll
+    assert pitch == 0, pitch
+
+    # accelerometer tipped onto its side pulls roll towards 90 degrees
+    gyro_model.set_word(0x28, 0)
+    acc_model.regs[2] = 64
+    acc_model.regs[3] = 0
+    last = roll
+    for _ in range(50):
+        roll, pitch = f.update()
+        assert roll >= last
+        last = roll
+    assert 5000 < roll < 9000, roll
+    return True
@@ -0,0 +1,121 @@
+from . import parts
+import sys
+import time
+import ustruct
+
+SYNC0 = 0xA5
+SYNC1 = 0x5A
+HEADER_SIZE = 8     # sync(2) length(1) seq(1) ticks_ms(4)
+
+
+def fletcher16(buf, start, end):
+    s1 = 0
+    s2 = 0
+    for i in range(start, end):
+        s1 = (s1 + buf[i]) % 255
+        s2 = (s2 + s1) % 255
+    return (s2 << 8) | s1
+
+
+class Telemetry():
+    """Binary telemetry frames over USB serial.
+
+    Frame: 0xA5 0x5A, '<B' payload length, '<B' sequence number,
+    '<I' ticks_ms, the payload as '<h' values, then '<H' Fletcher-16 over
+    everything from the length byte to the end of the payload.
+
+    Channels per part, in the order the parts were added:
+    Accelerometer x/y/z in mg, ColorSensor r/g/b, DCMotor motion/power
+    (-1 until first commanded), anything else get_value().
+
+    Call poll() from the main loop; frames go out at rate_hz and late
+    polls add the skipped frames to dropped.
+    """
+
+    def __init__(self, rate_hz=50, *, stream=None, max_channels=32):
+        if rate_hz <= 0:
+            raise ValueError('rate_hz must be more than 0')
+        if max_channels > 127:
+            raise ValueError('max_channels must be 127 or less')
+        self._period_us = 1000000 // rate_hz
+        self._stream = stream if stream is not None else sys.stdout.buffer
+        self._sources = []
+        self._channels = 0
+        self._max_channels = max_channels
+        self._buf = bytearray(HEADER_SIZE + 2 * max_channels + 2)
+        self._mv = memoryview(self._buf)
+        self._buf[0] = SYNC0
+        self._buf[1] = SYNC1
+        self.start()
+
+    def start(self):
+        """Restart the schedule and counters; the next poll() sends at once."""
+        self._seq = 0
+        self._next = None
+        self.sent = 0
+        self.dropped = 0
+
+    def add(self, part):
+        if isinstance(part, (parts.Accelerometer, parts.ColorSensor)):
+            n = 3
+        elif isinstance(part, parts.DCMotor):
+            n = 2
+        elif hasattr(part, 'get_value'):
+            n = 1
+        else:
+            raise TypeError('part has no telemetry channels')
+        if self._channels + n > self._max_channels:
+            raise ValueError('too many channels')
+        self._sources.append(part)
+        self._channels += n
+
+    def poll(self):
+        """Send a frame if one is due; returns True when a frame was sent."""
+        now = time.ticks_us()
+        if self._next is None:
+            # setup time before the first poll() is not a dropped frame
+            self._next = now
+        late = time.ticks_diff(now, self._next)
+        if late < 0:
+            return False
+        missed = late // self._period_us
+        if missed:
+            self.dropped += missed
+        self._next = time.ticks_add(self._next, (missed + 1) * self._period_us)
+        self.send()
+        return True
+
+    def send(self):
+        buf = self._buf
+        pos = HEADER_SIZE
+        for part in self._sources:
+            if isinstance(part, parts.Accelerometer):
+                x, y, z = part.get_values()
+                ustruct.pack_into('<hhh', buf, pos, int(x * 1000), int(y * 1000), int(z * 1000))
+                pos += 6
+            elif isinstance(part, parts.ColorSensor):
+                part.get_values()
+                ustruct.pack_into('<hhh', buf, pos, part.red, part.green, part.blue)
+                pos += 6
+            elif isinstance(part, parts.DCMotor):
+                motion, power = part.get_state()
+                ustruct.pack_into('<hh', buf, pos,
+                                  -1 if motion is None else motion,
+                                  -1 if power is None else power)
+                pos += 4
+            else:
+                ustruct.pack_into('<h', buf, pos, int(part.get_value()))
+                pos += 2
+
+        buf[2] = pos - HEADER_SIZE
+        buf[3] = self._seq
+        ustruct.pack_into('<I', buf, 4, time.ticks_ms())
+        ustruct.pack_into('<H', buf, pos, fletcher16(buf, 2, pos))
+        pos += 2
+
+        written = self._stream.write(self._mv[:pos])
+        if (written is not None) and (written < pos):
+            self.dropped += 1
+        else:
+            self.sent += 1
+        self._seq = (self._seq + 1) & 0xff
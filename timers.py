@@ -0,0 +1,33 @@
+import machine
+
+# timer id -> owner; the ESP32 has hardware timers 0-3
+_owners = {}
+
+
+def claim(timer_id, owner):
+    """Reserve hardware timer timer_id for owner and return it.
+
+    Raises RuntimeError if another owner already holds it, instead of
+    letting a second init() silently take over the first user's timer.
+    """
+    current = _owners.get(timer_id)
+    if (current is not None) and (current is not owner):
+        raise RuntimeError('Timer %d is already used by %s' % (timer_id, _name(current)))
+    _owners[timer_id] = owner
+    return machine.Timer(timer_id)
+
+
+def release(timer_id, owner):
+    if _owners.get(timer_id) is owner:
+        del _owners[timer_id]
+
+
+def owners():
+    """List of (timer_id, owner name) for every claimed timer."""
+    return [(tid, _name(owner)) for tid, owner in _owners.items()]
+
+
+def _name(owner):
+    if isinstance(owner, type):
+        return owner.__name__
+    return type(owner).__name__
@@ -0,0 +1,130 @@
+"""Fit a ColorSensor calibration table from labeled samples.
+
+Record samples on the device for every color, e.g.
+
+    cs.record_samples(ColorSensor.COLOR_RED, 200, '/red.bin')
+
+copy the files to the host and run
+
+    python colorcal.py color.cal red.bin green.bin ...
+
+then load the table at startup with cs.load_calibration('/color.cal').
+
+Each class is modelled as a Gaussian in (x, y) chromaticity. Every grid
+cell takes the class with the smallest Mahalanobis distance, or
+COLOR_UNDEF when none is within --max-distance standard deviations, so
+the device classifies with a single table lookup.
+"""
+import argparse
+import struct
+
+import numpy as np
+
+MAGIC = b'ACAL'
+VERSION = 1
+HEADER = '<4sBBhhhBBB'
+
+# must match fastpath.COLOR_X/Y/Z
+COLOR_X = (1181, 380, 385)
+COLOR_Y = (609, 1285, 154)
+COLOR_Z = (55, 145, 2030)
+
+COLOR_UNDEF = 0
+
+
+def read_samples(paths):
+    """(N, 4) uint8 array of red, green, blue, label."""
+    return np.concatenate([np.fromfile(p, dtype=np.uint8).reshape(-1, 4) for p in paths])
+
+
+def color_xy(rgb):
+    """Integer chromaticity in 1/1000 units, same arithmetic as the device."""
+    rgb = rgb.astype(np.int64)
+    X = rgb @ np.array(COLOR_X)
+    Y = rgb @ np.array(COLOR_Y)
+    S = X + Y + rgb @ np.array(COLOR_Z)
+    S = np.where(S == 0, 1, S)
+    return np.stack([X * 1000 // S, Y * 1000 // S], axis=1)
+
+
+def fit(samples, *, lost=25, step=10, pad=30, max_distance=3.0, regularize=4.0):
+    """Return (x0, y0, step, grid) with grid a (height, width) uint8 array."""
+    rgb = samples[:, :3]
+    labels = samples[:, 3]
+    keep = ~np.all(rgb <= lost, axis=1)
+    xy = color_xy(rgb[keep])
+    labels = labels[keep]
+    classes = np.unique(labels[labels != COLOR_UNDEF])
+    if len(classes) == 0:
+        raise ValueError('no labeled samples above the lost threshold')
+
+    x0, y0 = xy.min(axis=0) - pad
+    x1, y1 = xy.max(axis=0) + pad
+    width = int(min(255, -(-(x1 - x0) // step)))
+    height = int(min(255, -(-(y1 - y0) // step)))
+
+    # cell centres, shape (height * width, 2)
+    cx = x0 + step * np.arange(width) + step / 2
+    cy = y0 + step * np.arange(height) + step / 2
+    centres = np.stack(np.meshgrid(cx, cy), axis=-1).reshape(-1, 2)
+
+    dist = np.empty((len(classes), len(centres)))
+    for i, c in enumerate(classes):
+        pts = xy[labels == c].astype(np.float64)
+        mean = pts.mean(axis=0)
+        cov = np.cov(pts, rowvar=False) if len(pts) > 1 else np.zeros((2, 2))
+        inv = np.linalg.inv(cov + np.eye(2) * regularize)
+        d = centres - mean
+        dist[i] = np.sqrt(np.einsum('ij,jk,ik->i', d, inv, d))
+
+    best = dist.argmin(axis=0)
+    codes = classes[best].astype(np.uint8)
+    codes[dist.min(axis=0) > max_distance] = COLOR_UNDEF
+    return int(x0), int(y0), step, codes.reshape(height, width)
+
+
+def lookup(rgb, x0, y0, step, grid, lost):
+    """Vectorized version of the device lookup, for checking a table."""
+    xy = color_xy(rgb)
+    ix = (xy[:, 0] - x0) // step
+    iy = (xy[:, 1] - y0) // step
+    height, width = grid.shape
+    inside = (ix >= 0) & (iy >= 0) & (ix < width) & (iy < height)
+    codes = np.zeros(len(rgb), dtype=np.uint8)
+    codes[inside] = grid[iy[inside], ix[inside]]
+    codes[np.all(rgb <= lost, axis=1)] = COLOR_UNDEF
+    return codes
+
+
+def write_table(path, x0, y0, step, grid, lost):
+    height, width = grid.shape
+    with open(path, 'wb') as f:
+        f.write(struct.pack(HEADER, MAGIC, VERSION, lost, x0, y0, step, width, height, 0))
+        f.write(np.ascontiguousarray(grid, dtype=np.uint8).tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('output')
+    parser.add_argument('samples', nargs='+')
+    parser.add_argument('--lost', type=int, default=25)
+    parser.add_argument('--step', type=int, default=10, help='cell size in 1/1000 units')
+    parser.add_argument('--max-distance', type=float, default=3.0)
+    args = parser.parse_args()
+
+    samples = read_samples(args.samples)
+    x0, y0, step, grid = fit(samples, lost=args.lost, step=args.step,
+                             max_distance=args.max_distance)
+    write_table(args.output, x0, y0, step, grid, args.lost)
+
+    predicted = lookup(samples[:, :3], x0, y0, step, grid, args.lost)
+    labels = samples[:, 3]
+    print('%dx%d cells, %d bytes' % (grid.shape[1], grid.shape[0], grid.size))
+    for c in np.unique(labels):
+        mask = labels == c
+        print('color %d: %d samples, %.1f%% correct'
+              % (c, mask.sum(), 100.0 * (predicted[mask] == c).mean()))
+
+
+if __name__ == '__main__':
+    main()
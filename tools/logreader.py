@@ -0,0 +1,69 @@
+"""Host-side reader for SensorLog files (see logger.py).
+
+    python logreader.py log.bin
+"""
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'ARLG'
+NAME_LENGTH = 8
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        head = f.read(10)
+        magic, version, n, record_size, header_size = struct.unpack('<4sBBHH', head)
+        if magic != MAGIC:
+            raise ValueError('%s is not a SensorLog file' % path)
+        names = []
+        scales = []
+        for _ in range(n):
+            name, scale = struct.unpack('<8sf', f.read(NAME_LENGTH + 4))
+            names.append(name.rstrip(b'\x00').decode())
+            scales.append(scale)
+    return {'version': version, 'names': names, 'scales': scales,
+            'record_size': record_size, 'header_size': header_size}
+
+
+def open_log(path):
+    """Return (header, records) where records is a read-only np.memmap.
+
+    records has a 'ticks_ms' field and one int16 field per channel; a
+    trailing partial record (e.g. from a power loss) is ignored.
+    """
+    header = read_header(path)
+    dtype = np.dtype([('ticks_ms', '<u4')] + [(name, '<i2') for name in header['names']])
+    if dtype.itemsize != header['record_size']:
+        raise ValueError('record size mismatch')
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        size = f.tell()
+    count = (size - header['header_size']) // dtype.itemsize
+    if count <= 0:
+        return header, np.zeros(0, dtype=dtype)
+    records = np.memmap(path, dtype=dtype, mode='r',
+                        offset=header['header_size'], shape=(count,))
+    return header, records
+
+
+def scaled(header, records, name):
+    """Channel values in their original units (float64 copy)."""
+    return records[name] * header['scales'][header['names'].index(name)]
+
+
+def main(argv):
+    header, records = open_log(argv[1])
+    print('%d records, channels: %s' % (len(records), ', '.join(header['names'])))
+    if len(records) > 1:
+        span = (int(records['ticks_ms'][-1]) - int(records['ticks_ms'][0])) & 0x3fffffff
+        print('span %.3f s, mean rate %.1f Hz' % (span / 1000, (len(records) - 1) * 1000 / max(span, 1)))
+    for name in header['names']:
+        v = scaled(header, records, name)
+        if len(v):
+            print('%-8s min %10.4f  mean %10.4f  max %10.4f' % (name, v.min(), v.mean(), v.max()))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
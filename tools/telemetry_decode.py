@@ -0,0 +1,97 @@
+"""Host-side decoder for Telemetry frames (see telemetry.py).
+
+    python telemetry_decode.py /dev/ttyACM0     # serial port or pty
+    python telemetry_decode.py capture.bin      # recorded stream
+
+Prints one CSV line per valid frame: seq, ticks_ms, values...
+"""
+import os
+import struct
+import sys
+
+SYNC = b'\xa5\x5a'
+HEADER_SIZE = 8
+
+
+def fletcher16(data):
+    s1 = 0
+    s2 = 0
+    for b in data:
+        s1 = (s1 + b) % 255
+        s2 = (s2 + s1) % 255
+    return (s2 << 8) | s1
+
+
+class Decoder():
+    """Incremental frame decoder; feed() bytes in any chunk size."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._last_seq = None
+        self.frames = 0
+        self.bad_checksum = 0
+        self.lost = 0       # frames missing according to sequence numbers
+
+    def feed(self, data):
+        self._buf.extend(data)
+        frames = []
+        while True:
+            i = self._buf.find(SYNC)
+            if i < 0:
+                # keep a possible first sync byte
+                del self._buf[:max(len(self._buf) - 1, 0)]
+                return frames
+            del self._buf[:i]
+            if len(self._buf) < HEADER_SIZE:
+                return frames
+            length = self._buf[2]
+            end = HEADER_SIZE + length + 2
+            if len(self._buf) < end:
+                return frames
+            frame = bytes(self._buf[:end])
+            (check,) = struct.unpack_from('<H', frame, end - 2)
+            if length % 2 or check != fletcher16(frame[2:end - 2]):
+                self.bad_checksum += 1
+                del self._buf[:1]   # resync from the next byte
+                continue
+            del self._buf[:end]
+
+            seq = frame[3]
+            if self._last_seq is not None:
+                self.lost += (seq - self._last_seq - 1) & 0xff
+            self._last_seq = seq
+            (ticks,) = struct.unpack_from('<I', frame, 4)
+            values = struct.unpack_from('<%dh' % (length // 2), frame, HEADER_SIZE)
+            self.frames += 1
+            frames.append((seq, ticks, values))
+
+
+def open_stream(path):
+    fd = os.open(path, os.O_RDONLY)
+    if os.isatty(fd):
+        import termios
+        import tty
+        tty.setraw(fd, termios.TCSANOW)
+    return fd
+
+
+def main(argv):
+    fd = open_stream(argv[1])
+    decoder = Decoder()
+    try:
+        while True:
+            data = os.read(fd, 4096)
+            if not data:
+                break
+            for seq, ticks, values in decoder.feed(data):
+                print(','.join(str(v) for v in (seq, ticks) + values))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(fd)
+    print('frames %d, lost %d, bad checksum %d'
+          % (decoder.frames, decoder.lost, decoder.bad_checksum), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -1,3 +1,6 @@
+from . import fastpath
+
+
 class Wire():
     __BUFFER_LENGTH = 32
 
@@ -27,8 +30,7 @@ class Wire():
 
         # perform blocking read into buffer
         read = self.__i2c.readfrom(address, quantity)
-        for i in range(quantity):
-            self.rxBuffer[i] = read[i]
+        fastpath.copy_bytes(self.rxBuffer, read, quantity)
 
         # set rx buffer iterator vars
         self.rxBufferIndex = 0
@@ -48,8 +50,7 @@ class Wire():
     def endTransmission(self, sendStop=True):
         # transmit buffer (blocking)
         data = bytearray(self.txBufferLength)
-        for i in range(self.txBufferLength):
-            data[i] = self.txBuffer[i]
+        fastpath.copy_bytes(data, self.txBuffer, self.txBufferLength)
         self.__i2c.writeto(self.txAddress, data, sendStop)
         # reset tx buffer iterator vars
         self.txBufferIndex = 0